@@ -1,19 +1,26 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import orjson
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 from tkinter import messagebox
-import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import threading
 from datetime import datetime
 import os
 import csv
 import time
 from typing import Dict, List, Set, Any
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import zip_longest
 from queue import Queue, Empty
 from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+# 把逗号翻译成空格后，str.split()即可按所有分隔符切分（空白由split自己处理）
+_TRANS = str.maketrans({',': ' '})
 
 @dataclass
 class QueryResult:
@@ -27,6 +34,11 @@ class QueryResult:
     valid_services: int = 0
     expired_services: int = 0
     total_services: int = 0
+    latest_start: str = ''
+    latest_end: str = ''
+    latest_remaining: int = 0
+    # 摊平后的服务明细：(类型, 名称, 开始, 结束, 剩余天数, 状态, 描述)
+    services: list = field(default_factory=list)
 
     def to_dict(self):
         """转换为字典以便JSON序列化"""
@@ -39,7 +51,11 @@ class QueryResult:
             'retry_count': self.retry_count,
             'valid_services': self.valid_services,
             'expired_services': self.expired_services,
-            'total_services': self.total_services
+            'total_services': self.total_services,
+            'latest_start': self.latest_start,
+            'latest_end': self.latest_end,
+            'latest_remaining': self.latest_remaining,
+            'services': self.services
         }
     
     @classmethod
@@ -47,6 +63,48 @@ class QueryResult:
         """从字典创建QueryResult对象"""
         return cls(**data)
 
+    def compute_services(self):
+        """结果到达时把嵌套的服务明细摊平成元组列表，顺带统计衍生信息
+
+        显示和导出都直接遍历services，不再各自走一遍
+        detailinfo的嵌套字典。接口返回的日期都是YYYY-MM-DD，
+        字典序即时间序，最近到期的一条直接按字符串比较得出。
+        """
+        if not (self.success and self.data.get('statusCode') == 200):
+            return
+        detail_info = self.data['data'].get('detailinfo', {})
+        services = []
+        valid_services = 0
+        expired_services = 0
+        for service_type in ['warranty', 'onsite', 'other']:
+            for item in detail_info.get(service_type, []):
+                remaining_days = int(item.get('DateDifference', 0))
+                if remaining_days > 0:
+                    valid_services += 1
+                else:
+                    expired_services += 1
+                services.append((
+                    service_type,
+                    item.get('ServiceProductName', '未知'),
+                    item.get('StartDate', '未知'),
+                    item.get('EndDate', '未知'),
+                    remaining_days,
+                    "在保" if remaining_days > 0 else "已过保",
+                    item.get('ServiceDescription', '')
+                ))
+
+                end_date = item.get('EndDate', '')
+                start_date = item.get('StartDate', '')
+                if end_date and start_date and end_date > self.latest_end:
+                    self.latest_start = start_date
+                    self.latest_end = end_date
+                    self.latest_remaining = remaining_days
+
+        self.services = services
+        self.valid_services = valid_services
+        self.expired_services = expired_services
+        self.total_services = valid_services + expired_services
+
 class WarrantyCheckerApp:
     def __init__(self, root):
         self.root = root
@@ -67,48 +125,71 @@ class WarrantyCheckerApp:
 
     def initialize_system(self):
         """初始化系统组件"""
-        self.text_lock = threading.Lock()
         self.executor = ThreadPoolExecutor(
             max_workers=96,
             thread_name_prefix="warranty_query"
         )
         self.message_queue = Queue()
-        self.query_cache: Dict[str, QueryResult] = {}
+        # 所有工作线程共享一个Session，复用keep-alive连接，避免每次查询都重新TLS握手
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.executor._max_workers,
+            max_retries=0
+        ))
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            'Accept': 'application/json',
+            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+            'Referer': 'https://newsupport.lenovo.com.cn/',
+            'Connection': 'keep-alive'
+        })
+        # 查询缓存按LRU淘汰，长时间运行不会无限占内存
+        self.query_cache: Dict[str, QueryResult] = OrderedDict()
         self.query_results: Dict[str, QueryResult] = {}
-        
+        # 最近一次查询解析出的序列号，导出时直接复用
+        self.current_serials: List[str] = []
+
         # 系统参数
         self.batch_size = 200
         self.min_interval = 0.01
         self.max_retries = 2
         self.timeout = 3
+        self.cache_maxsize = 10000
         
+        # 检查点写盘放到后台线程，主循环只负责投递快照请求
+        self.save_queue = Queue()
+        self.save_thread = threading.Thread(
+            target=self._save_worker,
+            name="warranty_save",
+            daemon=True
+        )
+        self.save_thread.start()
+
         # 启动消息处理
         self.root.after(100, self.process_message_queue)
         self.load_previous_results()
 
     def query_with_retry(self, serial: str, index: int, total: int) -> QueryResult:
         """优化的查询函数"""
-        if serial in self.query_cache:
-            return self.query_cache[serial]
-
-        session = requests.Session()
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'application/json',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Referer': 'https://newsupport.lenovo.com.cn/',
-            'Connection': 'keep-alive'
-        }
+        # 单次get取值：并发淘汰可能在contains和取值之间移走条目
+        result = self.query_cache.get(serial)
+        if result is not None:
+            try:
+                self.query_cache.move_to_end(serial)
+            except KeyError:
+                pass  # 刚好被其他线程淘汰，结果仍然可用
+            return result
 
         for retry_count in range(self.max_retries + 1):
             try:
-                response = session.get(
+                response = self.session.get(
                     f"https://newsupport.lenovo.com.cn/api/drive/{serial}/drivewarrantyinfo",
-                    headers=headers,
                     timeout=self.timeout
                 )
                 response.raise_for_status()
-                data = response.json()
+                # 直接用orjson解析原始字节，跳过requests的编码探测和额外拷贝
+                data = orjson.loads(response.content)
 
                 if data['statusCode'] == 200:
                     result = QueryResult(
@@ -119,7 +200,10 @@ class WarrantyCheckerApp:
                         data=data,
                         retry_count=retry_count
                     )
+                    result.compute_services()
                     self.query_cache[serial] = result
+                    while len(self.query_cache) > self.cache_maxsize:
+                        self.query_cache.popitem(last=False)
                     return result
 
                 if retry_count < self.max_retries:
@@ -155,6 +239,7 @@ class WarrantyCheckerApp:
         if not self.validate_query(serials):
             return
 
+        self.current_serials = serials
         self.prepare_query(len(serials))
         progress = self.create_progress_bar(len(serials))
 
@@ -167,35 +252,75 @@ class WarrantyCheckerApp:
         """执行查询逻辑"""
         completed = 0
         failed_serials: Set[str] = set()
-        futures = []
-
-        # 提交所有查询任务
+        # UI泵按时间间隔触发：查询快慢都只付出固定的刷新成本。
+        # 这里必须用update()而不是update_idletasks()：查询期间主线程一直
+        # 阻塞在本函数里，只有update()会分发after定时器，消息泵才能继续
+        # 刷新结果面板
+        last_pump = time.monotonic()
+
+        # 先把命中缓存的序列号分出来，避免白白走一趟线程池
+        cached_results = []
+        pending = []
         for index, serial in enumerate(serials, 1):
-            future = self.executor.submit(self.query_with_retry, serial, index, len(serials))
-            futures.append(future)
-            if len(futures) % 20 == 0:
+            result = self.query_cache.get(serial)
+            if result is not None:
+                cached_results.append(result)
+            else:
+                pending.append((index, serial))
+
+        # 缓存命中的结果直接在主线程展示
+        for result in cached_results:
+            completed += 1
+            progress['value'] = completed
+            self.update_result_text(result)
+            self.query_results[result.serial] = result
+            if time.monotonic() - last_pump > 0.05:
+                self.root.update()
+                last_pump = time.monotonic()
+
+        # 未缓存的查询按滑动窗口提交：在途future数量封顶，
+        # 再大的输入也不会一次性堆出几万个future
+        total = len(serials)
+        max_inflight = self.executor._max_workers * 2
+        next_index = 0
+        inflight = set()
+
+        while next_index < len(pending) and len(inflight) < max_inflight:
+            index, serial = pending[next_index]
+            next_index += 1
+            inflight.add(self.executor.submit(self.query_with_retry, serial, index, total))
+            if time.monotonic() - last_pump > 0.05:
                 self.root.update()
+                last_pump = time.monotonic()
+
+        # 处理查询结果，每完成一个就补提交一个，保持窗口满载
+        while inflight:
+            done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+            for future in done:
+                if next_index < len(pending):
+                    index, serial = pending[next_index]
+                    next_index += 1
+                    inflight.add(self.executor.submit(self.query_with_retry, serial, index, total))
+
+                try:
+                    result = future.result()
+                    completed += 1
+                    progress['value'] = completed
+
+                    self.update_result_text(result)
+                    if time.monotonic() - last_pump > 0.05:
+                        self.root.update()
+                        last_pump = time.monotonic()
 
-        # 处理查询结果
-        for future in as_completed(futures):
-            try:
-                result = future.result()
-                completed += 1
-                progress['value'] = completed
-                
-                self.update_result_text(result)
-                if completed % 20 == 0:
-                    self.root.update()
-
-                if result.success and result.data['statusCode'] == 200:
-                    self.query_results[result.serial] = result
-                    if completed % 100 == 0:
-                        self.save_results()
-                else:
-                    failed_serials.add(result.serial)
+                    if result.success and result.data['statusCode'] == 200:
+                        self.query_results[result.serial] = result
+                        if completed % 100 == 0:
+                            self.save_results()
+                    else:
+                        failed_serials.add(result.serial)
 
-            except Exception as e:
-                print(f"处理结果时出错: {e}")
+                except Exception as e:
+                    print(f"处理结果时出错: {e}")
 
         self.save_results()
         self.handle_failed_queries(failed_serials)
@@ -204,7 +329,7 @@ class WarrantyCheckerApp:
         """处理失败的查询"""
         if failed_serials:
             # 不要清空输入框，只显示失败信息
-            self.message_queue.put(f"\n共有 {len(failed_serials)} 个序列号查询失败")
+            self.message_queue.put(f"\n共有 {len(failed_serials)} 个序列号查询失败\n")
             # 保留失败的序列号在输入框中，但不清除已有的查询结果
             failed_text = "\n".join(failed_serials)
             self.serial_text.delete("1.0", tk.END)
@@ -220,36 +345,25 @@ class WarrantyCheckerApp:
         if not text:
             return []
         
-        # 首先按换行符分割
-        items = text.splitlines()
-        # 将每一行再按逗号和空格分割
-        result = []
-        invalid_serials = []
-        
-        for item in items:
-            # 使用正则表达式分割（支持逗号、空格、制表符等）
-            parts = re.split(r'[,\s]+', item.strip())
-            for part in parts:
-                serial = part.strip()
-                if serial:
-                    # 验证序列号格式（假设联想序列号为字母数字组合，长度在8-20位之间）
-                    if re.match(r'^[A-Za-z0-9]{8,20}$', serial):
-                        result.append(serial.upper())  # 转换为大写
-                    else:
-                        invalid_serials.append(serial)
-        
-        # 检查重复的序列号
+        # 逗号换成空格后一次性切分（换行、空格、制表符都由split处理），
+        # 验证和去重在同一趟循环里完成
         seen = set()
-        duplicates = []
         unique_result = []
-        
-        for serial in result:
-            if serial not in seen:
-                seen.add(serial)
-                unique_result.append(serial)
+        invalid_serials = []
+        duplicates = []
+
+        for serial in text.translate(_TRANS).split():
+            # 验证序列号格式（假设联想序列号为字母数字组合，长度在8-20位之间）
+            if serial.isascii() and serial.isalnum() and 8 <= len(serial) <= 20:
+                serial = serial.upper()  # 转换为大写
+                if serial in seen:
+                    duplicates.append(serial)
+                else:
+                    seen.add(serial)
+                    unique_result.append(serial)
             else:
-                duplicates.append(serial)
-        
+                invalid_serials.append(serial)
+
         # 如果有无效或重复的序列号，显示警告
         warning_message = ""
         if invalid_serials:
@@ -268,83 +382,74 @@ class WarrantyCheckerApp:
     def process_message_queue(self):
         """处理消息队列中的UI更新请求"""
         try:
-            while True:
-                message = self.message_queue.get_nowait()
-                if isinstance(message, dict):
-                    self._update_result_display(message)
-                else:
-                    self.result_text.insert(tk.END, str(message) + "\n")
+            chunks = []
+            try:
+                while True:
+                    message = self.message_queue.get_nowait()
+                    if isinstance(message, QueryResult):
+                        chunks.append(self._update_result_display(message))
+                    elif callable(message):
+                        # 工作线程投递的UI回调（例如导出完成的弹窗）在主线程执行，
+                        # 回调抛异常不能拖垮消息泵
+                        try:
+                            message()
+                        except Exception as e:
+                            print(f"处理UI回调出错: {e}")
+                    else:
+                        chunks.append(str(message))
+            except Empty:
+                pass
+            # 所有待显示内容合并成一次insert，避免Text控件反复重排
+            if chunks:
+                self.result_text.insert(tk.END, ''.join(chunks))
                 self.result_text.see(tk.END)
-        except Empty:
-            pass
         finally:
-            # 继续监听消息队列
+            # 继续监听消息队列（无论上面发生什么都要把泵排下去）
             self.root.after(100, self.process_message_queue)
 
-    def _update_result_display(self, result: QueryResult):
-        """实际更新显示结果的函数"""
-        try:
-            self.result_text.insert(tk.END, f"\n序列号 {result.index}/{result.total}: {result.serial}\n")
-            self.result_text.insert(tk.END, "="*80 + "\n")
-            
-            if result.success:
-                data = result.data
-                if data['statusCode'] == 200:
-                    detail_info = data['data'].get('detailinfo', {})
-                    service_types = ['warranty', 'onsite', 'other']
-                    
-                    valid_services = 0
-                    expired_services = 0
-                    
-                    for service_type in service_types:
-                        if service_type in detail_info:
-                            self.result_text.insert(tk.END, f"\n【{service_type}类型服务】\n")
-                            self.result_text.insert(tk.END, "-"*40 + "\n")
-                            
-                            for item in detail_info[service_type]:
-                                remaining_days = int(item.get('DateDifference', 0))
-                                warranty_status = "在保" if remaining_days > 0 else "已过保"
-                                
-                                if remaining_days > 0:
-                                    valid_services += 1
-                                else:
-                                    expired_services += 1
-                                
-                                self.result_text.insert(tk.END, f"服务名称: {item.get('ServiceProductName', '未知')}\n")
-                                self.result_text.insert(tk.END, f"开始时间: {item.get('StartDate', '未知')}\n")
-                                self.result_text.insert(tk.END, f"结束时间: {item.get('EndDate', '未知')}\n")
-                                self.result_text.insert(tk.END, f"剩余天数: {remaining_days} 天\n")
-                                self.result_text.insert(tk.END, f"保修状态: {warranty_status}\n")
-                                if 'ServiceDescription' in item:
-                                    self.result_text.insert(tk.END, f"服务描述: {item['ServiceDescription']}\n")
-                                self.result_text.insert(tk.END, "-"*40 + "\n")
-                    
-                    result.valid_services = valid_services
-                    result.expired_services = expired_services
-                    result.total_services = valid_services + expired_services
-                    
-                    self.result_text.insert(tk.END, f"\n服务统计:\n")
-                    self.result_text.insert(tk.END, f"在保服务数量: {valid_services}\n")
-                    self.result_text.insert(tk.END, f"过保服务数量: {expired_services}\n")
-                    self.result_text.insert(tk.END, f"总服务数量: {valid_services + expired_services}\n")
-                else:
-                    self.result_text.insert(tk.END, f"查询失败: {data.get('message', '未知错误')}\n")
-                    self.result_text.insert(tk.END, "建议稍后重试此序列号\n")
+    def _update_result_display(self, result: QueryResult) -> str:
+        """把查询结果渲染成待显示的文本"""
+        parts = [f"\n序列号 {result.index}/{result.total}: {result.serial}\n"]
+        parts.append("="*80 + "\n")
+
+        if result.success:
+            data = result.data
+            if data['statusCode'] == 200:
+                # 服务明细在结果到达时已经摊平、统计好
+                prev_type = None
+                for service_type, name, start, end, remaining_days, status, description in result.services:
+                    if service_type != prev_type:
+                        parts.append(f"\n【{service_type}类型服务】\n")
+                        parts.append("-"*40 + "\n")
+                        prev_type = service_type
+
+                    parts.append(f"服务名称: {name}\n")
+                    parts.append(f"开始时间: {start}\n")
+                    parts.append(f"结束时间: {end}\n")
+                    parts.append(f"剩余天数: {remaining_days} 天\n")
+                    parts.append(f"保修状态: {status}\n")
+                    if description:
+                        parts.append(f"服务描述: {description}\n")
+                    parts.append("-"*40 + "\n")
+
+                parts.append(f"\n服务统计:\n")
+                parts.append(f"在保服务数量: {result.valid_services}\n")
+                parts.append(f"过保服务数量: {result.expired_services}\n")
+                parts.append(f"总服务数量: {result.total_services}\n")
             else:
-                error_msg = result.data.get('error', '未知错误') if isinstance(result.data, dict) else str(result.data)
-                self.result_text.insert(tk.END, f"查询出错: {error_msg}\n")
-                self.result_text.insert(tk.END, "可能是网络问题，建议稍后重试此序列号\n")
-            
-            self.result_text.insert(tk.END, "\n" + "="*80 + "\n")
-            self.result_text.see(tk.END)  # 自动滚动到底部
-            
-        except Exception as e:
-            print(f"更新显示出错: {e}")  # 用于调试
+                parts.append(f"查询失败: {data.get('message', '未知错误')}\n")
+                parts.append("建议稍后重试此序列号\n")
+        else:
+            error_msg = result.data.get('error', '未知错误') if isinstance(result.data, dict) else str(result.data)
+            parts.append(f"查询出错: {error_msg}\n")
+            parts.append("可能是网络问题，建议稍后重试此序列号\n")
+
+        parts.append("\n" + "="*80 + "\n")
+        return ''.join(parts)
 
     def update_result_text(self, result: QueryResult):
-        """将结果放入消息队列"""
-        with self.text_lock:
-            self._update_result_display(result)
+        """把结果放入消息队列，渲染统一由主线程完成"""
+        self.message_queue.put(result)
 
     def load_previous_results(self):
         """加载之前的查询结果"""
@@ -354,20 +459,52 @@ class WarrantyCheckerApp:
                 with open("query_results.json", "r", encoding='utf-8') as f:
                     saved_results = json.load(f)
                     for serial, result_dict in saved_results.items():
-                        self.query_results[serial] = QueryResult.from_dict(result_dict)
+                        result = QueryResult.from_dict(result_dict)
+                        # 兼容旧格式的历史文件：缺少服务明细时补算一次
+                        if not result.services:
+                            result.compute_services()
+                        self.query_results[serial] = result
         except Exception as e:
             print(f"加载历史记录失败: {e}")
 
     def save_results(self):
+        """请求后台线程保存一次查询结果"""
+        self.save_queue.put(True)
+
+    def _save_worker(self):
+        """后台保存线程：合并积压的保存请求，写临时文件后原子替换"""
+        while True:
+            request = self.save_queue.get()
+            shutdown = request is None
+            pending_snapshot = not shutdown
+            # 把排队的请求一次取完，只保留最新的一次快照；
+            # 和退出哨兵一起排队的保存请求不能丢
+            try:
+                while not shutdown:
+                    request = self.save_queue.get_nowait()
+                    if request is None:
+                        shutdown = True
+                    else:
+                        pending_snapshot = True
+            except Empty:
+                pass
+            if pending_snapshot:
+                self._write_results()
+            if shutdown:
+                break
+
+    def _write_results(self):
         """保存查询结果到文件"""
         try:
             # 将QueryResult对象转换为可序列化的字典
             serializable_results = {
-                serial: result.to_dict() 
-                for serial, result in self.query_results.items()
+                serial: result.to_dict()
+                for serial, result in list(self.query_results.items())
             }
-            with open("query_results.json", "w", encoding='utf-8') as f:
-                json.dump(serializable_results, f, ensure_ascii=False, indent=2)
+            # orjson在C层完成编码，且不再缩进，检查点写入快一个数量级、文件也更小
+            with open("query_results.json.tmp", "wb") as f:
+                f.write(orjson.dumps(serializable_results))
+            os.replace("query_results.json.tmp", "query_results.json")
         except Exception as e:
             print(f"保存结果失败: {e}")
 
@@ -381,105 +518,95 @@ class WarrantyCheckerApp:
             self.serial_text.delete("1.0", tk.END)
             self.result_text.delete("1.0", tk.END)
             self.query_results.clear()  # 清空存储的结果
+            self.current_serials = []
             if os.path.exists("query_results.json"):
                 os.remove("query_results.json")  # 删除结果文件
 
     def export_to_csv(self):
-        """导出结果到Excel文件"""
-        try:
-            # 获取当前输入框中的序列号列表作为排序参考
-            current_serials = self.parse_serial_numbers(self.serial_text.get("1.0", tk.END))
-            if not current_serials:
-                messagebox.showwarning("警告", "请先输入要导出的序列号！")
-                return
-            
-            # 检查是否有查询结果
-            has_results = any(serial in self.query_results for serial in current_serials)
-            if not has_results:
-                messagebox.showwarning("警告", "没有可导出的查询结果！")
-                return
+        """校验后把导出任务交给线程池，避免写Excel时冻结界面"""
+        # 复用最近一次查询解析出的序列号作为排序参考，
+        # 没查询过才退回解析输入框（避免再跑一遍验证和重复弹窗）
+        current_serials = self.current_serials or self.parse_serial_numbers(
+            self.serial_text.get("1.0", tk.END))
+        if not current_serials:
+            messagebox.showwarning("警告", "请先输入要导出的序列号！")
+            return
 
+        # 检查是否有查询结果
+        has_results = any(serial in self.query_results for serial in current_serials)
+        if not has_results:
+            messagebox.showwarning("警告", "没有可导出的查询结果！")
+            return
+
+        self.executor.submit(self._do_export, current_serials)
+
+    def _do_export(self, current_serials: List[str]):
+        """在工作线程里生成Excel文件，完成后经消息队列通知主线程"""
+        try:
             if not os.path.exists("导出结果"):
                 os.makedirs("导出结果")
             
             filename = f"导出结果/联想保修查询结果_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            
-            wb = Workbook()
-            ws_summary = wb.active
-            ws_summary.title = "汇总信息"
-            ws_detail = wb.create_sheet("详细信息")
-            
+
+            # 先把两张表的行收集到列表里，最后用write_only模式流式写入；
+            # 列宽在收集时顺手统计，写入前不用再遍历一遍所有行
+            summary_rows = []
+            summary_widths = {}
+            detail_rows = []
+            detail_widths = {}
+
+            def collect_row(rows, widths, row):
+                for col, value in enumerate(row, 1):
+                    length = len(str(value))
+                    if length > widths.get(col, 0):
+                        widths[col] = length
+                rows.append(row)
+
             # 统计数据
             total_queries = len(current_serials)
-            success_queries = sum(1 for serial in current_serials 
-                                if serial in self.query_results 
-                                and self.query_results[serial].success 
-                                and self.query_results[serial].data['statusCode'] == 200)
+            success_queries = sum(1 for result in map(self.query_results.get, current_serials)
+                                if result is not None
+                                and result.success
+                                and result.data['statusCode'] == 200)
             failed_queries = total_queries - success_queries
             
             # 收集在保和过保的序列号
             in_warranty_serials = []
             out_warranty_serials = []
             
-            # 收集所有序列号的信息
+            # 收集所有序列号的信息（每个序列号恰好占一个槽位，预分配后按下标填）
             in_warranty_info = []
             out_warranty_info = []
-            all_serials_info = []
-            
+            all_serials_info = [None] * len(current_serials)
+
             # 处理每个序列号
-            for serial in current_serials:
-                if serial in self.query_results:
-                    result = self.query_results[serial]
-                    if result.success and result.data['statusCode'] == 200:
-                        # 获取最新的维保信息
-                        latest_start_date = None
-                        latest_end_date = None
-                        remaining_days = 0
-                        detail_info = result.data['data'].get('detailinfo', {})
-                        
-                        for service_type in ['warranty', 'onsite', 'other']:
-                            if service_type in detail_info:
-                                for item in detail_info[service_type]:
-                                    end_date = item.get('EndDate', '')
-                                    start_date = item.get('StartDate', '')
-                                    current_remaining_days = int(item.get('DateDifference', 0))
-                                    if end_date:
-                                        try:
-                                            current_end_date = datetime.strptime(end_date, '%Y-%m-%d')
-                                            current_start_date = datetime.strptime(start_date, '%Y-%m-%d')
-                                            if latest_end_date is None or current_end_date > latest_end_date:
-                                                latest_end_date = current_end_date
-                                                latest_start_date = current_start_date
-                                                remaining_days = current_remaining_days
-                                        except ValueError:
-                                            continue
-                        
-                        if latest_start_date and latest_end_date:
-                            info = (
-                                serial,
-                                latest_start_date.strftime('%Y-%m-%d'),
-                                latest_end_date.strftime('%Y-%m-%d'),
-                                remaining_days
-                            )
-                            all_serials_info.append(info)
-                            
-                            if remaining_days > 0:
-                                in_warranty_serials.append(serial)
-                                in_warranty_info.append(info)
-                            else:
-                                out_warranty_serials.append(serial)
-                                out_warranty_info.append(info)
-                        else:
-                            all_serials_info.append((serial, '', '', 0))
+            for slot, serial in enumerate(current_serials):
+                info = (serial, '', '', 0)
+                result = self.query_results.get(serial)
+                if (result is not None
+                        and result.success
+                        and result.data['statusCode'] == 200
+                        and result.latest_start and result.latest_end):
+                    # 最新维保信息在结果到达时已经算好
+                    remaining_days = result.latest_remaining
+                    info = (
+                        serial,
+                        result.latest_start,
+                        result.latest_end,
+                        remaining_days
+                    )
+                    if remaining_days > 0:
+                        in_warranty_serials.append(serial)
+                        in_warranty_info.append(info)
                     else:
-                        all_serials_info.append((serial, '', '', 0))
-                else:
-                    all_serials_info.append((serial, '', '', 0))
+                        out_warranty_serials.append(serial)
+                        out_warranty_info.append(info)
+                all_serials_info[slot] = info
             
             # 写入汇总表
-            ws_summary.append(['汇总信息'])
-            ws_summary.append(['总查询数量', '查询成功数量', '查询失败数量', '在保机器数量', '过保机器数量'])
-            ws_summary.append([
+            collect_row(summary_rows, summary_widths, ['汇总信息'])
+            collect_row(summary_rows, summary_widths, ['总查询数量', '查询成功数量', '查询失败数量', '在保机器数量', '过保机器数量'])
+            collect_row(summary_rows, summary_widths, [
                 total_queries, 
                 success_queries, 
                 failed_queries, 
@@ -488,87 +615,61 @@ class WarrantyCheckerApp:
             ])
             
             # 添加空行
-            ws_summary.append([])
+            collect_row(summary_rows, summary_widths, [])
             
             # 写入三组数据的表头
-            ws_summary.append([
+            collect_row(summary_rows, summary_widths, [
                 '在保机器序列号', '维保开始时间', '维保到期时间', '剩余天数',
                 '过保机器序列号', '维保开始时间', '维保到期时间', '过保天数',
                 '所有机器序列号', '维保开始时间', '维保到期时间', '剩余/过保天数'
             ])
             
-            # 获取最大长度并补齐数据
-            max_length = max(len(in_warranty_info), len(out_warranty_info), len(all_serials_info))
-            in_warranty_padded = in_warranty_info + [('', '', '', '')] * (max_length - len(in_warranty_info))
-            out_warranty_padded = out_warranty_info + [('', '', '', '')] * (max_length - len(out_warranty_info))
-            all_serials_padded = all_serials_info
-            
-            # 并排写入三组数据
-            for in_info, out_info, all_info in zip(in_warranty_padded, out_warranty_padded, all_serials_padded):
-                row = []
-                # 添加在保信息
-                row.extend(in_info)
-                # 添加过保信息
-                row.extend(out_info)
-                # 添加所有序列号信息
-                row.extend(all_info)
-                ws_summary.append(row)
+            # 并排写入三组数据，较短的两列由zip_longest自动补空
+            for in_info, out_info, all_info in zip_longest(
+                    in_warranty_info, out_warranty_info, all_serials_info,
+                    fillvalue=('', '', '', '')):
+                collect_row(summary_rows, summary_widths, [*in_info, *out_info, *all_info])
             
             # 写入详细信息表头
-            ws_detail.append(['序列号', '查询状态', '在保服务数', '过保服务数', '总服务数', 
+            collect_row(detail_rows, detail_widths, ['序列号', '查询状态', '在保服务数', '过保服务数', '总服务数', 
                              '服务名称', '开始时间', '结束时间', '剩余天数', '保修状态'])
             
             # 按输入顺序写入详细数据
             for serial in current_serials:
-                if serial in self.query_results:
-                    result = self.query_results[serial]
+                result = self.query_results.get(serial)
+                if result is not None:
                     if result.success and result.data['statusCode'] == 200:
-                        detail_info = result.data['data'].get('detailinfo', {})
-                        service_info = []
-                        
-                        for service_type in ['warranty', 'onsite', 'other']:
-                            if service_type in detail_info:
-                                for item in detail_info[service_type]:
-                                    remaining_days = int(item.get('DateDifference', 0))
-                                    warranty_status = "在保" if remaining_days > 0 else "已过保"
-                                    service_info.append({
-                                        'name': item.get('ServiceProductName', '未知'),
-                                        'start': item.get('StartDate', '未知'),
-                                        'end': item.get('EndDate', '未知'),
-                                        'days': remaining_days,
-                                        'status': warranty_status
-                                    })
-                        
-                        if service_info:
-                            for idx, service in enumerate(service_info):
+                        # 服务明细在结果到达时已经摊平成元组列表
+                        if result.services:
+                            for idx, (_, name, start, end, days, status, _) in enumerate(result.services):
                                 if idx == 0:
-                                    ws_detail.append([
+                                    collect_row(detail_rows, detail_widths, [
                                         result.serial,
                                         '成功',
                                         result.valid_services,
                                         result.expired_services,
                                         result.total_services,
-                                        service['name'],
-                                        service['start'],
-                                        service['end'],
-                                        service['days'],
-                                        service['status']
+                                        name,
+                                        start,
+                                        end,
+                                        days,
+                                        status
                                     ])
                                 else:
-                                    ws_detail.append([
+                                    collect_row(detail_rows, detail_widths, [
                                         '',
                                         '',
                                         '',
                                         '',
                                         '',
-                                        service['name'],
-                                        service['start'],
-                                        service['end'],
-                                        service['days'],
-                                        service['status']
+                                        name,
+                                        start,
+                                        end,
+                                        days,
+                                        status
                                     ])
                         else:
-                            ws_detail.append([
+                            collect_row(detail_rows, detail_widths, [
                                 result.serial,
                                 '成功',
                                 0, 0, 0,
@@ -576,7 +677,7 @@ class WarrantyCheckerApp:
                                 '', '', '', ''
                             ])
                     else:
-                        ws_detail.append([
+                        collect_row(detail_rows, detail_widths, [
                             serial,
                             '失败',
                             0, 0, 0,
@@ -584,7 +685,7 @@ class WarrantyCheckerApp:
                             '', '', '', ''
                         ])
                 else:
-                    ws_detail.append([
+                    collect_row(detail_rows, detail_widths, [
                         serial,
                         '未查询',
                         0, 0, 0,
@@ -592,31 +693,40 @@ class WarrantyCheckerApp:
                         '', '', '', ''
                     ])
             
-            # 调整列宽
-            for ws in [ws_summary, ws_detail]:
-                for column in ws.columns:
-                    max_length = 0
-                    column = list(column)
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = (max_length + 2)
-                    ws.column_dimensions[column[0].column_letter].width = adjusted_width
-            
-            # 保存文件
+            # write_only模式流式写入，不在内存里保留整张表
+            wb = Workbook(write_only=True)
+            for title, rows, widths in [("汇总信息", summary_rows, summary_widths),
+                                        ("详细信息", detail_rows, detail_widths)]:
+                ws = wb.create_sheet(title)
+                # write_only模式要求先设列宽再写行
+                for col, length in widths.items():
+                    ws.column_dimensions[get_column_letter(col)].width = length + 2
+                for row in rows:
+                    ws.append(row)
+
+            # 保存文件，弹窗必须回到主线程执行
             wb.save(filename)
-            messagebox.showinfo("成功", f"结果已导出到：\n{filename}")
-            os.startfile(os.path.abspath("导出结果"))
+            self.message_queue.put(lambda: self._notify_export_done(filename))
         except Exception as e:
-            messagebox.showerror("错误", f"导出失败：{str(e)}")
+            error = str(e)
+            self.message_queue.put(lambda: messagebox.showerror("错误", f"导出失败：{error}"))
+
+    def _notify_export_done(self, filename: str):
+        """导出完成后的主线程回调"""
+        messagebox.showinfo("成功", f"结果已导出到：\n{filename}")
+        os.startfile(os.path.abspath("导出结果"))
 
     def __del__(self):
-        # 确保程序退出时关闭线程池
+        # 确保程序退出时关闭线程池、保存线程和共享连接
         if hasattr(self, 'executor'):
             self.executor.shutdown(wait=False)
+        if hasattr(self, 'save_queue'):
+            self.save_queue.put(None)
+            # 等最后一次检查点落盘，守护线程不能在写到一半时被进程退出掐断
+            if hasattr(self, 'save_thread'):
+                self.save_thread.join(timeout=5)
+        if hasattr(self, 'session'):
+            self.session.close()
 
     def create_main_frame(self):
         """创建主框架"""